@@ -4,8 +4,9 @@ import tempfile
 from pathlib import Path
 from docx import Document
 from docx.shared import RGBColor
+from lxml import etree
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
@@ -13,8 +14,12 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT, TA_JUSTIFY
 import io
+import re
+import threading
+from functools import lru_cache
 import requests
 from urllib.parse import urlparse
+from xml.sax.saxutils import escape
 
 # Set page config
 st.set_page_config(
@@ -50,91 +55,168 @@ FONTS_REGISTERED = {
     'helvetica_available': True
 }
 
+# On-disk font cache, shared across sessions and process restarts
+FONT_CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'punjabi-pdf2word'
+
+GURMUKHI_FONTS = {
+    'NotoSansGurmukhi': "https://github.com/notofonts/notofonts.github.io/raw/main/fonts/NotoSansGurmukhi/hinted/ttf/NotoSansGurmukhi-Regular.ttf",
+    'NotoSansGurmukhi-Bold': "https://github.com/notofonts/notofonts.github.io/raw/main/fonts/NotoSansGurmukhi/hinted/ttf/NotoSansGurmukhi-Bold.ttf",
+}
+
 @st.cache_data
 def download_font(font_url, font_name):
-    """Download and cache a font file"""
+    """Download a font file into the on-disk cache and return its path"""
+    font_path = FONT_CACHE_DIR / f"{font_name}.ttf"
+    if font_path.exists():
+        return str(font_path)
+    
+    temp_path = None
     try:
-        response = requests.get(font_url, timeout=30)
-        response.raise_for_status()
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.ttf') as font_file:
-            font_file.write(response.content)
-            return font_file.name
+        FONT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with requests.get(font_url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            # Stream into a temp file next to the cache entry, then rename it
+            # into place so no reader ever sees a partially written font
+            with tempfile.NamedTemporaryFile(dir=FONT_CACHE_DIR, suffix='.part', delete=False) as font_file:
+                temp_path = font_file.name
+                for chunk in response.iter_content(65536):
+                    font_file.write(chunk)
+        os.replace(temp_path, font_path)
+        return str(font_path)
     except Exception as e:
+        # Never leave a truncated font behind in the cache
+        if temp_path:
+            Path(temp_path).unlink(missing_ok=True)
         st.warning(f"Could not download {font_name}: {e}")
         return None
 
 def register_fonts():
-    """Register all required fonts"""
+    """Register all required fonts (once per process)"""
     global FONTS_REGISTERED
     
+    # ReportLab's font registry outlives Streamlit script reruns
+    registered = pdfmetrics.getRegisteredFontNames()
+    FONTS_REGISTERED['gurmukhi_regular'] = 'NotoSansGurmukhi' in registered
+    FONTS_REGISTERED['gurmukhi_bold'] = 'NotoSansGurmukhi-Bold' in registered
+    if FONTS_REGISTERED['gurmukhi_regular'] and FONTS_REGISTERED['gurmukhi_bold']:
+        return
+    
     try:
         # Download and register Gurmukhi Regular
-        regular_url = "https://github.com/notofonts/notofonts.github.io/raw/main/fonts/NotoSansGurmukhi/hinted/ttf/NotoSansGurmukhi-Regular.ttf"
-        regular_path = download_font(regular_url, "Noto Sans Gurmukhi Regular")
-        
-        if regular_path:
-            pdfmetrics.registerFont(TTFont('NotoSansGurmukhi', regular_path))
-            FONTS_REGISTERED['gurmukhi_regular'] = True
+        if not FONTS_REGISTERED['gurmukhi_regular']:
+            regular_path = download_font(GURMUKHI_FONTS['NotoSansGurmukhi'], 'NotoSansGurmukhi')
+            
+            if regular_path:
+                pdfmetrics.registerFont(TTFont('NotoSansGurmukhi', regular_path))
+                FONTS_REGISTERED['gurmukhi_regular'] = True
             
         # Download and register Gurmukhi Bold
-        bold_url = "https://github.com/notofonts/notofonts.github.io/raw/main/fonts/NotoSansGurmukhi/hinted/ttf/NotoSansGurmukhi-Bold.ttf"
-        bold_path = download_font(bold_url, "Noto Sans Gurmukhi Bold")
-        
-        if bold_path:
-            pdfmetrics.registerFont(TTFont('NotoSansGurmukhi-Bold', bold_path))
-            FONTS_REGISTERED['gurmukhi_bold'] = True
+        if not FONTS_REGISTERED['gurmukhi_bold']:
+            bold_path = download_font(GURMUKHI_FONTS['NotoSansGurmukhi-Bold'], 'NotoSansGurmukhi-Bold')
+            
+            if bold_path:
+                pdfmetrics.registerFont(TTFont('NotoSansGurmukhi-Bold', bold_path))
+                FONTS_REGISTERED['gurmukhi_bold'] = True
             
     except Exception as e:
         st.error(f"Font registration error: {e}")
 
+register_fonts()
+
+GURMUKHI_PATTERN = re.compile(r'[\u0A00-\u0A7F]')
+
 def is_gurmukhi_text(text):
     """Check if text contains Gurmukhi characters"""
-    if not text:
-        return False
-    gurmukhi_range = range(0x0A00, 0x0A7F)
-    return any(ord(char) in gurmukhi_range for char in text)
+    return bool(text) and GURMUKHI_PATTERN.search(text) is not None
 
-def get_text_formatting(run):
-    """Extract formatting from a Word run"""
+# WordprocessingML lookups on a run's raw <w:r> element
+WORD_NAMESPACES = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+RUNS_XPATH = etree.XPath('./w:r', namespaces=WORD_NAMESPACES)
+RUN_CONTENT_XPATH = etree.XPath('./w:t | ./w:tab | ./w:br | ./w:cr', namespaces=WORD_NAMESPACES)
+RUN_PROPERTIES_XPATH = etree.XPath('./w:rPr', namespaces=WORD_NAMESPACES)
+BOLD_XPATH = etree.XPath('./w:b', namespaces=WORD_NAMESPACES)
+ITALIC_XPATH = etree.XPath('./w:i', namespaces=WORD_NAMESPACES)
+UNDERLINE_XPATH = etree.XPath('./w:u/@w:val', namespaces=WORD_NAMESPACES)
+SIZE_XPATH = etree.XPath('./w:sz/@w:val', namespaces=WORD_NAMESPACES)
+COLOR_XPATH = etree.XPath('./w:color/@w:val', namespaces=WORD_NAMESPACES)
+WORD_VAL = '{%s}val' % WORD_NAMESPACES['w']
+WORD_TEXT = '{%s}t' % WORD_NAMESPACES['w']
+WORD_TAB = '{%s}tab' % WORD_NAMESPACES['w']
+HEX_COLOR_PATTERN = re.compile(r'[0-9A-Fa-f]{6}')
+
+DEFAULT_COLOR = '#000000'
+
+DEFAULT_FORMATTING = {
+    'bold': False,
+    'italic': False,
+    'underline': False,
+    'size': 12,
+    'color': DEFAULT_COLOR
+}
+
+def is_toggle_on(elements):
+    """Check a Word on/off property such as <w:b/> (no w:val means on)"""
+    return bool(elements) and elements[0].get(WORD_VAL, 'true').lower() not in ('0', 'false', 'off')
+
+def get_runs(paragraph):
+    """Get (text, <w:r> element) pairs for a paragraph, bypassing python-docx Run objects"""
+    runs = []
+    for run_element in RUNS_XPATH(paragraph._element):
+        # Same text rules as python-docx: tabs become '\t', breaks become '\n'
+        text_parts = []
+        for child in RUN_CONTENT_XPATH(run_element):
+            if child.tag == WORD_TEXT:
+                text_parts.append(child.text or '')
+            elif child.tag == WORD_TAB:
+                text_parts.append('\t')
+            else:
+                text_parts.append('\n')
+        runs.append(("".join(text_parts), run_element))
+    return runs
+
+def get_style_flags(rpr):
+    """Get (bold, italic, underline) from a run's <w:rPr> element"""
+    return (is_toggle_on(BOLD_XPATH(rpr)), is_toggle_on(ITALIC_XPATH(rpr)), UNDERLINE_XPATH(rpr) == ['single'])
+
+def get_run_style_flags(run_element):
+    """Get just (bold, italic, underline) for a run's <w:r> element"""
+    run_properties = RUN_PROPERTIES_XPATH(run_element)
+    if not run_properties:
+        return (False, False, False)
+    return get_style_flags(run_properties[0])
+
+def get_text_formatting(run_element):
+    """Extract formatting from a Word run's <w:r> element"""
+    run_properties = RUN_PROPERTIES_XPATH(run_element)
+    if not run_properties:
+        return dict(DEFAULT_FORMATTING)
+    rpr = run_properties[0]
+    
+    bold, italic, underline = get_style_flags(rpr)
     formatting = {
-        'bold': False,
-        'italic': False,
-        'underline': False,
-        'size': 12,
-        'color': '#000000'
+        'bold': bold,
+        'italic': italic,
+        'underline': underline,
+        'size': DEFAULT_FORMATTING['size'],
+        'color': DEFAULT_FORMATTING['color']
     }
     
-    try:
-        # Check bold
-        if (hasattr(run, 'bold') and run.bold is True) or \
-           (hasattr(run, 'font') and hasattr(run.font, 'bold') and run.font.bold is True):
-            formatting['bold'] = True
-            
-        # Check italic
-        if (hasattr(run, 'italic') and run.italic is True) or \
-           (hasattr(run, 'font') and hasattr(run.font, 'italic') and run.font.italic is True):
-            formatting['italic'] = True
-            
-        # Check underline
-        if (hasattr(run, 'underline') and run.underline is True) or \
-           (hasattr(run, 'font') and hasattr(run.font, 'underline') and run.font.underline is True):
-            formatting['underline'] = True
-            
-        # Get font size
-        if hasattr(run, 'font') and run.font.size and hasattr(run.font.size, 'pt'):
-            formatting['size'] = run.font.size.pt
-            
-        # Get color
-        if hasattr(run, 'font') and run.font.color and hasattr(run.font.color, 'rgb') and run.font.color.rgb:
-            rgb_val = run.font.color.rgb
-            formatting['color'] = f"#{rgb_val:06x}"
-            
-    except Exception:
-        pass
+    # Font size is stored in half-points
+    size = SIZE_XPATH(rpr)
+    if size and size[0].isdigit() and int(size[0]):
+        formatting['size'] = int(size[0]) / 2
+        
+    # Color is a hex string or 'auto'; explicit black keeps the shared default
+    color = COLOR_XPATH(rpr)
+    if color and color[0] != '000000' and HEX_COLOR_PATTERN.fullmatch(color[0]):
+        formatting['color'] = '#' + color[0].lower()
         
     return formatting
 
+def get_style_key(formatting):
+    """Get the (bold, italic, underline, size, color) tuple that decides uniform formatting"""
+    return (formatting['bold'], formatting['italic'], formatting['underline'], formatting['size'], formatting['color'])
+
 def get_best_font(text, is_bold=False, is_italic=False):
     """Get the best available font for the given text and formatting"""
     if is_gurmukhi_text(text):
@@ -166,44 +248,81 @@ def get_best_font(text, is_bold=False, is_italic=False):
         else:
             return 'Helvetica'
 
+# Base font size for heading styles, checked in order as substrings of the
+# style name (so custom names like 'Heading 1 Custom' match); else 12pt
+BASE_FONT_SIZES = (
+    ('Heading 1', 18),
+    ('Heading 2', 16),
+    ('Heading 3', 14),
+    ('Title', 20),
+)
+
+@lru_cache(maxsize=None)
+def get_base_font_size(style_name):
+    """Get the base font size for a paragraph style name"""
+    for name, size in BASE_FONT_SIZES:
+        if name in style_name:
+            return size
+    return 12
+
+# Word paragraph alignment -> ReportLab alignment
+PARAGRAPH_ALIGNMENTS = {
+    0: TA_LEFT,      # WD_ALIGN_PARAGRAPH.LEFT
+    1: TA_CENTER,    # WD_ALIGN_PARAGRAPH.CENTER
+    2: TA_RIGHT,     # WD_ALIGN_PARAGRAPH.RIGHT
+    3: TA_JUSTIFY,   # WD_ALIGN_PARAGRAPH.JUSTIFY
+}
+
 def get_paragraph_alignment(paragraph):
     """Get ReportLab alignment from Word paragraph"""
-    alignment_map = {
-        0: TA_LEFT,      # WD_ALIGN_PARAGRAPH.LEFT
-        1: TA_CENTER,    # WD_ALIGN_PARAGRAPH.CENTER
-        2: TA_RIGHT,     # WD_ALIGN_PARAGRAPH.RIGHT
-        3: TA_JUSTIFY,   # WD_ALIGN_PARAGRAPH.JUSTIFY
-    }
-    if hasattr(paragraph, 'alignment') and paragraph.alignment is not None:
-        return alignment_map.get(paragraph.alignment, TA_LEFT)
-    return TA_LEFT
+    # None (inherited alignment) is not a key, so it falls back to TA_LEFT too
+    return PARAGRAPH_ALIGNMENTS.get(paragraph.alignment, TA_LEFT)
 
+@lru_cache(maxsize=256)
 def hex_to_reportlab_color(hex_color):
-    """Convert hex color to ReportLab color"""
-    try:
-        if hex_color.startswith('#'):
-            hex_color = hex_color[1:]
-        r = int(hex_color[0:2], 16) / 255.0
-        g = int(hex_color[2:4], 16) / 255.0
-        b = int(hex_color[4:6], 16) / 255.0
-        return colors.Color(r, g, b)
-    except:
-        return colors.black
-
-def convert_docx_to_pdf(docx_bytes, output_filename):
+    """Convert a '#rrggbb' color (as produced by get_text_formatting) to a ReportLab color"""
+    value = int(hex_color.lstrip('#'), 16)
+    return colors.Color(((value >> 16) & 0xFF) / 255.0, ((value >> 8) & 0xFF) / 255.0, (value & 0xFF) / 255.0)
+
+# Bound on conversions running at once across all sessions; uploads that
+# cannot get a slot within CONVERSION_WAIT_SECONDS are turned away
+MAX_CONCURRENT_CONVERSIONS = int(os.environ.get('MAX_CONCURRENT_CONVERSIONS', os.cpu_count() or 1))
+CONVERSION_WAIT_SECONDS = 60
+
+@st.cache_resource
+def get_conversion_slots():
+    """Get the process-wide semaphore that limits concurrent conversions"""
+    return threading.BoundedSemaphore(MAX_CONCURRENT_CONVERSIONS)
+
+# Shared parent for every generated paragraph style
+BASE_PARAGRAPH_STYLE = getSampleStyleSheet()['Normal']
+
+@lru_cache(maxsize=512)
+def get_paragraph_style(font_name, font_size, alignment, color_hex, space_after, left_indent):
+    """Get a shared ParagraphStyle for the given formatting"""
+    return ParagraphStyle(
+        f'Converted_{font_name}_{font_size}_{alignment}_{color_hex}_{space_after}_{left_indent}',
+        parent=BASE_PARAGRAPH_STYLE,
+        fontName=font_name,
+        fontSize=font_size,
+        alignment=alignment,
+        textColor=hex_to_reportlab_color(color_hex),
+        spaceAfter=space_after,
+        leftIndent=left_indent,
+        leading=font_size * 1.2,
+        # Shape TTF text (Gurmukhi conjuncts and matras) with HarfBuzz via uharfbuzz
+        shaping=1
+    )
+
+@st.cache_resource(max_entries=8)
+def load_document(file_id, _docx_file):
+    """Parse an uploaded DOCX once and reuse it across Streamlit reruns"""
+    _docx_file.seek(0)
+    return Document(_docx_file)
+
+def convert_docx_to_pdf(doc, output_filename):
     """Convert DOCX to PDF with comprehensive formatting preservation"""
     try:
-        # Register fonts
-        register_fonts()
-        
-        # Create temporary DOCX file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_docx:
-            temp_docx.write(docx_bytes)
-            temp_docx_path = temp_docx.name
-
-        # Read the document
-        doc = Document(temp_docx_path)
-        
         # Analyze document formatting
         stats = {
             'bold_runs': 0,
@@ -214,38 +333,6 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
             'font_sizes': set()
         }
         
-        for paragraph in doc.paragraphs:
-            for run in paragraph.runs:
-                if run.text.strip():
-                    fmt = get_text_formatting(run)
-                    if fmt['bold']:
-                        stats['bold_runs'] += 1
-                    if fmt['italic']:
-                        stats['italic_runs'] += 1
-                    if fmt['underline']:
-                        stats['underline_runs'] += 1
-                    if fmt['color'] != '#000000':
-                        stats['colored_runs'] += 1
-                    if is_gurmukhi_text(run.text):
-                        stats['gurmukhi_runs'] += 1
-                    stats['font_sizes'].add(fmt['size'])
-        
-        # Display analysis
-        st.success(f"""
-        📊 **Document Analysis:**
-        - Bold text runs: {stats['bold_runs']}
-        - Italic text runs: {stats['italic_runs']}
-        - Underlined text runs: {stats['underline_runs']}
-        - Colored text runs: {stats['colored_runs']}
-        - Punjabi text runs: {stats['gurmukhi_runs']}
-        - Font sizes: {sorted(list(stats['font_sizes']))}
-        
-        🔤 **Font Status:**
-        - Gurmukhi Regular: {'✅' if FONTS_REGISTERED['gurmukhi_regular'] else '❌'}
-        - Gurmukhi Bold: {'✅' if FONTS_REGISTERED['gurmukhi_bold'] else '❌'}
-        - Helvetica variants: ✅
-        """)
-        
         # Create PDF
         buffer = io.BytesIO()
         pdf_doc = SimpleDocTemplate(
@@ -257,28 +344,31 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
             rightMargin=1*inch
         )
         
-        styles = getSampleStyleSheet()
         story = []
+        debug = st.session_state.get("debug", False)
+        show_analysis = st.session_state.get("show_analysis", False) or st.query_params.get("debug") == "1"
+        debug_lines = []
+        list_count = 0
         
         # Process each paragraph
         for para_idx, paragraph in enumerate(doc.paragraphs):
-            if not paragraph.text.strip():
+            style_name = paragraph.style.name if paragraph.style else 'Normal'
+            
+            # Numbered list items seen so far (empty ones included)
+            list_number = list_count
+            if 'List Number' in style_name:
+                list_count += 1
+            
+            runs = get_runs(paragraph)
+            paragraph_text = "".join(run_text for run_text, run_element in runs)
+            if not paragraph_text.strip():
                 continue
                 
             # Get paragraph properties
             alignment = get_paragraph_alignment(paragraph)
-            style_name = paragraph.style.name if paragraph.style else 'Normal'
             
             # Determine base font size
-            base_size = 12
-            if 'Heading 1' in style_name:
-                base_size = 18
-            elif 'Heading 2' in style_name:
-                base_size = 16
-            elif 'Heading 3' in style_name:
-                base_size = 14
-            elif 'Title' in style_name:
-                base_size = 20
+            base_size = get_base_font_size(style_name)
             
             # Handle list items
             is_list_item = 'List' in style_name
@@ -288,57 +378,60 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
                     list_prefix = "● "  # Use filled circle bullet (U+25CF) which renders better
                 elif 'Number' in style_name:
                     # Simple numbering - could be enhanced
-                    list_number = sum(1 for i, p in enumerate(doc.paragraphs[:para_idx]) 
-                                    if 'List Number' in (p.style.name if p.style else ''))
                     list_prefix = f"{list_number + 1}. "
             
-            # Check if paragraph has uniform formatting
-            runs_with_text = [run for run in paragraph.runs if run.text.strip()]
-            if not runs_with_text:
+            # Extract formatting once per run; whitespace-only runs are kept
+            # so the spacing between differently formatted runs survives
+            run_fmts = [(run_text, get_text_formatting(run_element)) for run_text, run_element in runs if run_text]
+            text_run_fmts = [(run_text, fmt) for run_text, fmt in run_fmts if run_text.strip()]
+            if not text_run_fmts:
                 continue
-                
-            # Get formatting of first run
-            first_fmt = get_text_formatting(runs_with_text[0])
-            uniform_formatting = True
             
-            for run in runs_with_text[1:]:
-                run_fmt = get_text_formatting(run)
-                if (run_fmt['bold'] != first_fmt['bold'] or 
-                    run_fmt['italic'] != first_fmt['italic'] or
-                    run_fmt['underline'] != first_fmt['underline']):
-                    uniform_formatting = False
-                    break
+            # Update document analysis (only when it will be shown)
+            if show_analysis:
+                for run_text, fmt in text_run_fmts:
+                    if fmt['bold']:
+                        stats['bold_runs'] += 1
+                    if fmt['italic']:
+                        stats['italic_runs'] += 1
+                    if fmt['underline']:
+                        stats['underline_runs'] += 1
+                    if fmt['color'] != DEFAULT_COLOR:
+                        stats['colored_runs'] += 1
+                    if is_gurmukhi_text(run_text):
+                        stats['gurmukhi_runs'] += 1
+                    stats['font_sizes'].add(fmt['size'])
+                
+            # Check if paragraph has uniform formatting
+            first_fmt = text_run_fmts[0][1]
+            uniform_formatting = len({get_style_key(fmt) for run_text, fmt in text_run_fmts}) == 1
             
             if uniform_formatting:
                 # Single paragraph with uniform formatting
-                font_name = get_best_font(paragraph.text, first_fmt['bold'], first_fmt['italic'])
-                text_color = hex_to_reportlab_color(first_fmt['color'])
+                font_name = get_best_font(paragraph_text, first_fmt['bold'], first_fmt['italic'])
                 
                 # Adjust spacing for lists
                 space_after = 3 if is_list_item else 6
                 left_indent = 20 if is_list_item else 0
                 
-                para_style = ParagraphStyle(
-                    f'Para_{para_idx}',
-                    parent=styles['Normal'],
-                    fontName=font_name,
-                    fontSize=max(first_fmt['size'], base_size),
-                    alignment=alignment,
-                    textColor=text_color,
-                    spaceAfter=space_after,
-                    leftIndent=left_indent,
-                    leading=max(first_fmt['size'], base_size) * 1.2
+                para_style = get_paragraph_style(
+                    font_name,
+                    max(first_fmt['size'], base_size),
+                    alignment,
+                    first_fmt['color'],
+                    space_after,
+                    left_indent
                 )
                 
                 # Handle underline and add list prefix
-                text_content = list_prefix + paragraph.text
+                text_content = escape(list_prefix + paragraph_text)
                 if first_fmt['underline']:
                     text_content = f"<u>{text_content}</u>"
                 
                 story.append(Paragraph(text_content, para_style))
                 
                 # Debug info
-                if first_fmt['bold'] or first_fmt['italic'] or is_list_item:
+                if debug and (first_fmt['bold'] or first_fmt['italic'] or is_list_item):
                     formatting_info = []
                     if first_fmt['bold']:
                         formatting_info.append("BOLD")
@@ -346,53 +439,39 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
                         formatting_info.append("ITALIC")
                     if is_list_item:
                         formatting_info.append("LIST")
-                    st.write(f"🎯 Uniform: {font_name} [{', '.join(formatting_info)}] - {text_content[:50]}...")
+                    debug_lines.append(f"🎯 Uniform: {font_name} [{', '.join(formatting_info)}] - {text_content[:50]}...")
                     
             else:
-                # Mixed formatting - handle each run separately
-                if is_list_item:
-                    # For list items with mixed formatting, add prefix to first run
-                    first_run_processed = False
+                # Mixed formatting - one paragraph with inline font markup per run
+                font_size = max(base_size, *(fmt['size'] for run_text, fmt in text_run_fmts))
+                parts = [escape(list_prefix)]
                 
-                for run_idx, run in enumerate(runs_with_text):
-                    if not run.text.strip():
+                for run_text, run_fmt in run_fmts:
+                    if not run_text.strip():
+                        parts.append(escape(run_text))
                         continue
-                        
-                    run_fmt = get_text_formatting(run)
-                    font_name = get_best_font(run.text, run_fmt['bold'], run_fmt['italic'])
-                    text_color = hex_to_reportlab_color(run_fmt['color'])
                     
-                    # Add list prefix to first run only
-                    run_text = run.text
-                    if is_list_item and not first_run_processed:
-                        run_text = list_prefix + run_text
-                        first_run_processed = True
+                    font_name = get_best_font(run_text, run_fmt['bold'], run_fmt['italic'])
+                    run_size = max(run_fmt['size'], base_size)
                     
-                    # Adjust spacing and indentation for lists
-                    space_after = 1 if is_list_item else 2
-                    left_indent = 20 if is_list_item else 0
-                    
-                    run_style = ParagraphStyle(
-                        f'Run_{para_idx}_{run_idx}',
-                        parent=styles['Normal'],
-                        fontName=font_name,
-                        fontSize=max(run_fmt['size'], base_size),
-                        alignment=alignment,
-                        textColor=text_color,
-                        spaceAfter=space_after,
-                        leftIndent=left_indent,
-                        leading=max(run_fmt['size'], base_size) * 1.2
-                    )
+                    # Only spell out size and color where they differ from the paragraph style
+                    font_attrs = [f'name="{font_name}"']
+                    if run_size != font_size:
+                        font_attrs.append(f'size="{run_size}"')
+                    if run_fmt['color'] != DEFAULT_COLOR:
+                        font_attrs.append(f'color="{run_fmt["color"]}"')
+                    open_tags = [f'<font {" ".join(font_attrs)}>']
+                    close_tags = ['</font>']
                     
                     # Handle underline
-                    text_content = run_text
                     if run_fmt['underline']:
-                        text_content = f"<u>{run_text}</u>"
+                        open_tags.append('<u>')
+                        close_tags.append('</u>')
                     
-                    story.append(Paragraph(text_content, run_style))
+                    parts.append("".join(open_tags) + escape(run_text) + "".join(reversed(close_tags)))
                     
                     # Debug info
-                    if run_fmt['bold'] or run_fmt['italic'] or is_list_item:
+                    if debug and (run_fmt['bold'] or run_fmt['italic'] or is_list_item):
                         formatting_info = []
                         if run_fmt['bold']:
                             formatting_info.append("BOLD")
@@ -400,11 +479,22 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
                             formatting_info.append("ITALIC")
                         if is_list_item:
                             formatting_info.append("LIST")
-                        st.write(f"🎯 Mixed: {font_name} [{', '.join(formatting_info)}] - {text_content[:30]}...")
+                        debug_lines.append(f"🎯 Mixed: {font_name} [{', '.join(formatting_info)}] - {run_text[:30]}...")
+                
+                # Adjust spacing and indentation for lists
+                space_after = 3 if is_list_item else 6
+                left_indent = 20 if is_list_item else 0
                 
-                # Add paragraph spacing for mixed formatting
-                if not is_list_item:
-                    story.append(Spacer(1, 6))
+                para_style = get_paragraph_style(
+                    get_best_font(paragraph_text),
+                    font_size,
+                    alignment,
+                    DEFAULT_COLOR,
+                    space_after,
+                    left_indent
+                )
+                
+                story.append(Paragraph("".join(parts), para_style))
         
         # Process tables with enhanced formatting
         for table in doc.tables:
@@ -412,50 +502,59 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
                 continue
                 
             table_data = []
+            # The header row is bold whenever there is a body below it
+            has_header = len(table.rows) > 1
             for row_idx, row in enumerate(table.rows):
+                is_header = has_header and row_idx == 0
+                cell_size = 12 if is_header else 11
                 row_data = []
                 for cell in row.cells:
                     # Process each cell with formatting
-                    cell_content = ""
+                    cell_parts = []
+                    cell_text = []
                     for para in cell.paragraphs:
-                        if para.text.strip():
-                            # Check if cell has formatting
-                            has_formatting = False
-                            for run in para.runs:
-                                if run.text.strip():
-                                    fmt = get_text_formatting(run)
-                                    if fmt['bold'] or fmt['italic'] or fmt['underline']:
-                                        has_formatting = True
-                                        break
+                        runs = get_runs(para)
+                        if not any(run_text.strip() for run_text, run_element in runs):
+                            continue
+                        
+                        para_parts = []
+                        for run_text, run_element in runs:
+                            if not run_text.strip():
+                                para_parts.append(escape(run_text))
+                                continue
+                            
+                            # Cells only use bold/italic/underline, so skip size and color
+                            bold, italic, underline = get_run_style_flags(run_element)
+                            font_name = get_best_font(run_text, bold or is_header, italic)
+                            run_markup = f'<font name="{font_name}">{escape(run_text)}</font>'
+                            if underline:
+                                run_markup = f"<u>{run_markup}</u>"
                             
-                            if has_formatting:
-                                # Build formatted cell content
-                                para_content = ""
-                                for run in para.runs:
-                                    if run.text.strip():
-                                        fmt = get_text_formatting(run)
-                                        run_text = run.text
-                                        
-                                        # Apply formatting tags
-                                        if fmt['underline']:
-                                            run_text = f"<u>{run_text}</u>"
-                                        if fmt['italic']:
-                                            run_text = f"<i>{run_text}</i>"
-                                        if fmt['bold']:
-                                            run_text = f"<b>{run_text}</b>"
-                                        
-                                        para_content += run_text
-                                cell_content += para_content + " "
-                            else:
-                                # Plain text
-                                cell_content += para.text + " "
+                            para_parts.append(run_markup)
+                            cell_text.append(run_text)
+                        cell_parts.append("".join(para_parts))
                     
-                    row_data.append(cell_content.strip())
+                    if not cell_parts:
+                        row_data.append("")
+                        continue
+                    
+                    # Cells are Paragraphs so the markup is rendered and the
+                    # Gurmukhi text is shaped like the body text
+                    cell_style = get_paragraph_style(
+                        get_best_font("".join(cell_text), is_header),
+                        cell_size,
+                        TA_LEFT,
+                        DEFAULT_COLOR,
+                        0,
+                        0
+                    )
+                    row_data.append(Paragraph(" ".join(cell_parts).strip(), cell_style))
                 table_data.append(row_data)
             
             if table_data:
-                # Create table with proper styling
-                pdf_table = Table(table_data)
+                # Create table with proper styling; spacing below it is part of
+                # the table rather than a separate Spacer flowable
+                pdf_table = Table(table_data, spaceAfter=12)
                 
                 # Enhanced table styling
                 table_style = [
@@ -480,19 +579,37 @@ def convert_docx_to_pdf(docx_bytes, output_filename):
                 
                 pdf_table.setStyle(TableStyle(table_style))
                 story.append(pdf_table)
-                story.append(Spacer(1, 12))
                 
                 # Debug info
-                st.write(f"🎯 Table: {len(table_data)} rows, {len(table_data[0]) if table_data else 0} columns processed")
+                if debug:
+                    debug_lines.append(f"🎯 Table: {len(table_data)} rows, {len(table_data[0]) if table_data else 0} columns processed")
         
         # Build PDF
         pdf_doc.build(story)
         
-        # Cleanup
-        os.unlink(temp_docx_path)
+        # Display analysis
+        if show_analysis:
+            st.success(f"""
+            📊 **Document Analysis:**
+            - Bold text runs: {stats['bold_runs']}
+            - Italic text runs: {stats['italic_runs']}
+            - Underlined text runs: {stats['underline_runs']}
+            - Colored text runs: {stats['colored_runs']}
+            - Punjabi text runs: {stats['gurmukhi_runs']}
+            - Font sizes: {sorted(list(stats['font_sizes']))}
+        
+            🔤 **Font Status:**
+            - Gurmukhi Regular: {'✅' if FONTS_REGISTERED['gurmukhi_regular'] else '❌'}
+            - Gurmukhi Bold: {'✅' if FONTS_REGISTERED['gurmukhi_bold'] else '❌'}
+            - Helvetica variants: ✅
+            """)
+        
+        # Show the collected debug log in one element
+        if debug and debug_lines:
+            st.code("\n".join(debug_lines))
         
         buffer.seek(0)
-        return buffer.getvalue()
+        return buffer
         
     except Exception as e:
         st.error(f"Conversion error: {str(e)}")
@@ -514,15 +631,27 @@ st.info("""
 - ✅ Automatic font fallback system
 """)
 
+st.sidebar.checkbox("Show formatting analysis", key="show_analysis")
+st.sidebar.checkbox("Show conversion debug log", key="debug")
+
 # File uploader
 uploaded_file = st.file_uploader("Choose a Word document (.docx)", type=['docx'])
 
 if uploaded_file is not None:
     try:
         with st.spinner('🔄 Converting document... Please wait...'):
-            pdf_bytes = convert_docx_to_pdf(uploaded_file.getvalue(), uploaded_file.name)
+            conversion_slots = get_conversion_slots()
+            if conversion_slots.acquire(timeout=CONVERSION_WAIT_SECONDS):
+                try:
+                    doc = load_document(uploaded_file.file_id, uploaded_file)
+                    pdf_buffer = convert_docx_to_pdf(doc, uploaded_file.name)
+                finally:
+                    conversion_slots.release()
+            else:
+                pdf_buffer = None
+                st.error("⏳ The server is busy converting other documents. Please try again in a moment.")
             
-            if pdf_bytes:
+            if pdf_buffer is not None:
                 st.success('✅ Conversion completed successfully!')
                 
                 # Download buttons
@@ -531,7 +660,7 @@ if uploaded_file is not None:
                 with col1:
                     st.download_button(
                         label="📄 Preview PDF",
-                        data=pdf_bytes,
+                        data=pdf_buffer,
                         file_name=f"preview_{Path(uploaded_file.name).stem}.pdf",
                         mime="application/pdf",
                         use_container_width=True
@@ -540,15 +669,17 @@ if uploaded_file is not None:
                 with col2:
                     st.download_button(
                         label="⬇️ Download PDF",
-                        data=pdf_bytes,
+                        data=pdf_buffer,
                         file_name=f"{Path(uploaded_file.name).stem}.pdf",
                         mime="application/pdf",
                         use_container_width=True
                     )
                 
                 # File info
-                st.info(f"📊 Original: {uploaded_file.name} ({len(uploaded_file.getvalue())/1024:.1f} KB)")
-                st.info(f"📄 PDF: {len(pdf_bytes)/1024:.1f} KB")
+                st.info(f"📊 Original: {uploaded_file.name} ({uploaded_file.size/1024:.1f} KB)")
+                pdf_size = pdf_buffer.seek(0, io.SEEK_END)
+                pdf_buffer.seek(0)
+                st.info(f"📄 PDF: {pdf_size/1024:.1f} KB")
                 
     except Exception as e:
         st.error(f'❌ Error: {str(e)}')